@@ -5,11 +5,15 @@ import json
 import random
 import logging
 import asyncio
+import hashlib
+import threading
 import joblib
+import orjson
 import numpy as np
-import pandas as pd
 from typing import List, Optional
-from datetime import datetime
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
 from pydantic import BaseModel
 from fastapi import FastAPI, HTTPException, Response, BackgroundTasks
 from fastapi.middleware.cors import CORSMiddleware
@@ -17,17 +21,39 @@ from prometheus_client import Counter, Histogram, Gauge, generate_latest, CONTEN
 from sklearn.ensemble import RandomForestClassifier
 from sklearn.pipeline import Pipeline
 from sklearn.base import BaseEstimator, TransformerMixin
-from kafka import KafkaProducer, KafkaConsumer
+from aiokafka import AIOKafkaProducer, AIOKafkaConsumer
+
+try:
+    from numba import njit
+except ImportError:  # fall back to the pure NumPy counters
+    njit = None
+
+try:
+    import treelite
+    import tl2cgen
+except ImportError:  # serve from the flattened leaf table instead
+    treelite = None
+
+try:
+    import ahocorasick
+except ImportError:  # single-pass regex alternation instead
+    ahocorasick = None
+
+try:
+    import redis.asyncio as aioredis
+except ImportError:  # only needed when REDIS_URL is set
+    aioredis = None
 
 # --- LOGGING SETUP ---
 class JsonFormatter(logging.Formatter):
     def format(self, record):
-        return json.dumps({
-            "timestamp": datetime.utcnow().isoformat(),
+        # record.created is already taken by logging; orjson formats the datetime natively
+        return orjson.dumps({
+            "timestamp": datetime.fromtimestamp(record.created, timezone.utc),
             "level": record.levelname,
             "message": record.getMessage(),
             "component": "backend"
-        })
+        }, option=orjson.OPT_UTC_Z).decode()
 
 logger = logging.getLogger("PhishingDetector")
 handler = logging.StreamHandler()
@@ -36,24 +62,159 @@ logger.addHandler(handler)
 logger.setLevel(logging.INFO)
 
 # --- MODULE 2: FEATURE ENGINEERING ---
+_IP_RE = re.compile(r'\d{1,3}(?:\.\d{1,3}){3}')
+_IP_RE_BYTES = re.compile(rb'\d{1,3}(?:\.\d{1,3}){3}')
+
+# Every feature is a small count or a 0/1 flag, so features are stored as
+# uint8 with counts saturating at 255
+FEATURE_DTYPE = np.uint8
+FEATURE_MAX = 255
+
+# The byte matrix pads every URL in a batch to the longest one, so longer
+# URLs are featurized one at a time instead
+MAX_MATRIX_URL_LENGTH = 2048
+
+if njit is not None:
+    @njit(cache=True)
+    def _count_digits_symbols(codes, digits_out, symbols_out):
+        # Single pass over each URL's bytes. Not parallel=True: batches
+        # already run concurrently on the predict pool threads.
+        for i in range(codes.shape[0]):
+            digits = 0
+            symbols = 0
+            for c in codes[i]:
+                if c == 0:  # zero padding marks the end of the URL
+                    break
+                if 0x30 <= c <= 0x39:
+                    digits += 1
+                elif not (0x61 <= c <= 0x7A):
+                    symbols += 1
+            digits_out[i] = min(digits, FEATURE_MAX)
+            symbols_out[i] = min(symbols, FEATURE_MAX)
+else:
+    def _count_digits_symbols(codes, digits_out, symbols_out):
+        digits = (codes >= 0x30) & (codes <= 0x39)
+        letters = (codes >= 0x61) & (codes <= 0x7A)
+        symbols = (codes > 0) & ~digits & ~letters
+        np.minimum(digits.sum(axis=1), FEATURE_MAX, out=digits_out, casting='unsafe')
+        np.minimum(symbols.sum(axis=1), FEATURE_MAX, out=symbols_out, casting='unsafe')
+
 class URLFeatureExtractor(BaseEstimator, TransformerMixin):
+    FEATURE_CACHE_SIZE = 8192
+    
     def fit(self, X, y=None): return self
     def transform(self, X, y=None):
-        return np.array([self._extract_features(url) for url in X])
+        return self._cached_features([str(url).lower() for url in X])
+    
+    def transform_lowercase(self, urls_lower):
+        # Same as transform for URLs the caller has already lowercased
+        return self._cached_features(list(urls_lower))
+    
+    def __getstate__(self):
+        # The feature cache and its lock are runtime state, not model state
+        # Copy first: on Python 3.11+ the base implementation returns __dict__ itself
+        state = dict(super().__getstate__())
+        state.pop('_feature_cache', None)
+        state.pop('_cache_lock', None)
+        return state
+    
+    def _cached_features(self, urls):
+        # Features are a pure function of the URL, so rows computed earlier are
+        # reused and only the misses go through _extract_features.
+        if not hasattr(self, '_feature_cache'):
+            self._feature_cache = {}
+            self._cache_lock = threading.Lock()
+        cache = self._feature_cache
+        
+        n = len(urls)
+        out = np.empty((n, 10), dtype=FEATURE_DTYPE)
+        misses = []
+        with self._cache_lock:
+            for i, url in enumerate(urls):
+                row = cache.get(url)
+                if row is None:
+                    misses.append(i)
+                else:
+                    out[i] = row
+        if not misses:
+            return out
+        
+        if len(misses) == n:
+            out = self._extract_features(urls)
+        else:
+            out[misses] = self._extract_features([urls[i] for i in misses])
+        with self._cache_lock:
+            for i in misses:
+                cache[urls[i]] = out[i].copy()
+            # FIFO eviction: dicts keep insertion order
+            while len(cache) > self.FEATURE_CACHE_SIZE:
+                del cache[next(iter(cache))]
+        return out
+    
+    def _extract_features(self, urls):
+        # `urls` is a list of lowercased strings. The byte matrix below only
+        # classifies ASCII and cannot represent NULs (NumPy strips trailing
+        # ones), so any other URL, or one too long to pad the batch to,
+        # takes the per-URL path.
+        n = len(urls)
+        simple = np.fromiter((len(url) <= MAX_MATRIX_URL_LENGTH and url.isascii()
+                              and '\x00' not in url for url in urls),
+                             dtype=bool, count=n)
+        if simple.all():
+            return self._extract_ascii_features(np.asarray(urls, dtype=bytes))
+        
+        out = np.empty((n, 10), dtype=FEATURE_DTYPE)
+        ascii_rows = np.flatnonzero(simple)
+        if len(ascii_rows):
+            out[ascii_rows] = self._extract_ascii_features(
+                np.asarray([urls[i] for i in ascii_rows], dtype=bytes))
+        for i in np.flatnonzero(~simple):
+            out[i] = self._extract_url_features(urls[i])
+        return out
+    
+    def _extract_ascii_features(self, urls):
+        # Whole-batch extraction: one NumPy call per feature instead of a
+        # Python loop per URL. `urls` is a fixed-width bytes array of
+        # lowercased ASCII URLs.
+        n = len(urls)
+        out = np.empty((n, 10), dtype=FEATURE_DTYPE)
+        
+        # View the fixed-width strings as a (n, width) byte matrix; shorter
+        # URLs are right-padded with zeros.
+        codes = urls.view(np.uint8).reshape(n, urls.itemsize)
+        
+        np.minimum(np.char.str_len(urls), FEATURE_MAX, out=out[:, 0], casting='unsafe')
+        out[:, 1] = np.char.find(urls, b'@') >= 0
+        np.minimum(np.char.count(urls, b'.'), FEATURE_MAX, out=out[:, 2], casting='unsafe')
+        out[:, 3] = np.char.find(urls, b'https') >= 0
+        out[:, 4] = np.char.find(urls, b'http://') >= 0
+        _count_digits_symbols(codes, out[:, 5], out[:, 6])
+        
+        # A dotted quad needs at least three dots, so only that subset (minus
+        # URLs already flagged by "ip") goes through the regex.
+        has_ip = np.char.find(urls, b'ip') >= 0
+        search = _IP_RE_BYTES.search
+        for i in np.flatnonzero(~has_ip & (out[:, 2] >= 3)):
+            has_ip[i] = search(urls[i]) is not None
+        out[:, 7] = has_ip
+        out[:, 8] = (np.char.find(urls, b'login') >= 0) | (np.char.find(urls, b'signin') >= 0)
+        out[:, 9] = (np.char.find(urls, b'bank') >= 0) | (np.char.find(urls, b'secure') >= 0) | \
+                    (np.char.find(urls, b'account') >= 0)
+        return out
     
-    def _extract_features(self, url):
-        url = str(url).lower()
+    def _extract_url_features(self, url):
+        # Reference per-URL implementation, with full unicode semantics
         return [
-            len(url), 
-            1 if "@" in url else 0, 
-            url.count('.'),
-            1 if "https" in url else 0, 
-            1 if "http://" in url else 0,
-            sum(c.isdigit() for c in url), 
-            sum(not c.isalnum() for c in url),
-            1 if "ip" in url or re.search(r'\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3}', url) else 0,
-            1 if "login" in url or "signin" in url else 0,
-            1 if "bank" in url or "secure" in url or "account" in url else 0
+            min(len(url), FEATURE_MAX), 
+            "@" in url, 
+            min(url.count('.'), FEATURE_MAX),
+            "https" in url, 
+            "http://" in url,
+            min(sum(c.isdigit() for c in url), FEATURE_MAX), 
+            min(sum(not c.isalnum() for c in url), FEATURE_MAX),
+            "ip" in url or _IP_RE.search(url) is not None,
+            "login" in url or "signin" in url,
+            "bank" in url or "secure" in url or "account" in url
         ]
 
 # --- METRICS ---
@@ -61,19 +222,152 @@ PREDICTION_COUNT = Counter("phishing_predictions_total", "Total predictions", ["
 PREDICTION_LATENCY = Histogram("prediction_latency_seconds", "Time taken for prediction")
 DRIFT_GAUGE = Gauge("model_drift_score", "Current concept drift score")
 
+# Labelled children are bound once so the hot path skips the label lookup
+PREDICTION_CLASSES = ["phishing", "benign"]
+PREDICTION_SOURCES = ["user", "automated_traffic"]
+prediction_counters = {
+    (pred_class, source): PREDICTION_COUNT.labels(pred_class=pred_class, source=source)
+    for pred_class in PREDICTION_CLASSES for source in PREDICTION_SOURCES
+}
+
 # --- MODEL TRAINING ---
-logger.info("Training Demo Model...")
-benign = [f"https://google.com/search?q={i}" for i in range(500)] + \
-         [f"https://wikipedia.org/wiki/{i}" for i in range(500)]
-phishing = [f"http://secure-bank-login-{i}.com" for i in range(500)] + \
-           [f"http://update-payment-verify-{i}.net" for i in range(500)]
-           
-df = pd.DataFrame({'url': benign + phishing, 'type': ['benign']*1000 + ['phishing']*1000})
-pipeline = Pipeline([
-    ('features', URLFeatureExtractor()),
-    ('classifier', RandomForestClassifier(n_estimators=50, max_depth=10, random_state=42))
-])
-pipeline.fit(df['url'], df['type'].apply(lambda x: 1 if x == 'phishing' else 0))
+# Only the fitted forest is persisted. The feature extractor is stateless, and
+# pickling it would tie the file to the name of the module that saved it
+# (phishing_system vs __main__).
+MODEL_PATH = os.getenv("MODEL_PATH", "rf_classifier.joblib")
+N_FEATURES = 10
+N_ESTIMATORS = 10
+MAX_DEPTH = 6
+
+# Digest of the model file the served forest was loaded from or saved to;
+# stays None if it could not be persisted
+model_file_digest: Optional[str] = None
+
+def file_digest(path):
+    with open(path, 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()[:16]
+
+def build_pipeline(classifier):
+    return Pipeline([
+        ('features', URLFeatureExtractor()),
+        ('classifier', classifier)
+    ])
+
+def train_model():
+    global model_file_digest
+    logger.info("Training Demo Model...")
+    benign = [f"https://google.com/search?q={i}" for i in range(500)] + \
+             [f"https://wikipedia.org/wiki/{i}" for i in range(500)]
+    phishing = [f"http://secure-bank-login-{i}.com" for i in range(500)] + \
+               [f"http://update-payment-verify-{i}.net" for i in range(500)]
+               
+    urls = benign + phishing
+    labels = np.concatenate([np.zeros(len(benign), dtype=np.int8), np.ones(len(phishing), dtype=np.int8)])
+    pipeline = build_pipeline(RandomForestClassifier(
+        n_estimators=N_ESTIMATORS, max_depth=MAX_DEPTH, n_jobs=-1, random_state=42))
+    pipeline.fit(urls, labels)
+    
+    # Write then rename so concurrently starting workers never load a partial file
+    tmp_path = f"{MODEL_PATH}.{os.getpid()}.tmp"
+    try:
+        joblib.dump(pipeline.named_steps['classifier'], tmp_path, compress=0)
+        os.replace(tmp_path, MODEL_PATH)
+        model_file_digest = file_digest(MODEL_PATH)
+        logger.info(f"Model saved to {MODEL_PATH}")
+    except OSError as e:
+        # A read-only or full disk should not stop the service; keep serving
+        # the in-memory model
+        model_file_digest = None
+        logger.warning(f"Could not save model to {MODEL_PATH}: {e}")
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+    return pipeline
+
+def check_classifier(classifier):
+    # A file written by another version of train_model would silently serve
+    # the wrong feature layout or forest shape
+    if not isinstance(classifier, RandomForestClassifier):
+        raise TypeError(f"expected a RandomForestClassifier, got {type(classifier).__name__}")
+    found = (getattr(classifier, 'n_features_in_', None), classifier.n_estimators, classifier.max_depth)
+    if found != (N_FEATURES, N_ESTIMATORS, MAX_DEPTH):
+        raise ValueError(f"expected (n_features_in_, n_estimators, max_depth) = "
+                         f"{(N_FEATURES, N_ESTIMATORS, MAX_DEPTH)}, got {found}")
+
+def load_model():
+    global model_file_digest
+    if os.path.exists(MODEL_PATH):
+        try:
+            digest = file_digest(MODEL_PATH)
+            # Uncompressed, so NumPy arrays in the pickle are memory-mapped
+            classifier = joblib.load(MODEL_PATH, mmap_mode='r')
+            check_classifier(classifier)
+            model_file_digest = digest
+            logger.info(f"Model loaded from {MODEL_PATH}")
+            return build_pipeline(classifier)
+        except Exception as e:
+            logger.warning(f"Could not load {MODEL_PATH}, retraining: {e}")
+    return train_model()
+
+# Stands in for the file digest when the model could not be saved, so
+# nothing keyed on the digest is shared with other processes
+process_digest = os.urandom(8).hex()
+
+def model_digest():
+    return model_file_digest or process_digest
+
+pipeline = load_model()
+# Serving calls the fitted steps directly, skipping Pipeline dispatch
+feature_extractor = pipeline.named_steps['features']
+classifier = pipeline.named_steps['classifier']
+classifier.n_jobs = 1  # joblib startup costs more than it saves on small batches
+
+def build_leaf_table(forest):
+    # (n_trees, n_nodes, n_classes) class probabilities for every node of every tree
+    n_nodes = max(est.tree_.node_count for est in forest.estimators_)
+    table = np.zeros((len(forest.estimators_), n_nodes, forest.n_classes_), dtype=np.float32)
+    for t, est in enumerate(forest.estimators_):
+        value = est.tree_.value[:, 0, :]
+        table[t, :len(value)] = value / value.sum(axis=1, keepdims=True)
+    return table
+
+leaf_table = build_leaf_table(classifier)
+tree_index = np.arange(len(classifier.estimators_))
+
+def forest_predict_proba(X):
+    # Equivalent to classifier.predict_proba: find each sample's leaf in every
+    # tree, gather the leaf probabilities and average over trees.
+    X = np.asarray(X, dtype=np.float32)  # the tree kernels only take float32
+    leaves = np.stack([est.tree_.apply(X) for est in classifier.estimators_], axis=1)
+    return leaf_table[tree_index, leaves].mean(axis=1)
+
+# Compile the forest to a native shared library when treelite is available
+TREELITE_LIB = os.getenv("TREELITE_LIB", "./rf.so")
+compiled_forest = None
+if treelite is not None:
+    try:
+        # The library is named after the saved model's digest, so it is only
+        # ever reused for the exact model it was compiled from
+        root, ext = os.path.splitext(TREELITE_LIB)
+        lib_path = f"{root}-{model_digest()}{ext}"
+        if not os.path.exists(lib_path):
+            # Build under a per-process name and rename, like the model dump
+            tmp_path = f"{root}-{os.getpid()}.tmp{ext}"
+            tl2cgen.export_lib(treelite.sklearn.import_model(classifier), toolchain='gcc',
+                               libpath=tmp_path, params={'parallel_comp': 4})
+            os.replace(tmp_path, lib_path)
+        compiled_forest = tl2cgen.Predictor(lib_path)
+        logger.info(f"Compiled forest loaded from {lib_path}")
+    except Exception as e:
+        logger.warning(f"Treelite compilation failed, using leaf table: {e}")
+
+def predict_phishing_proba(X):
+    if compiled_forest is not None:
+        # Output is (n_samples, 1, n_classes); keep the phishing column
+        return compiled_forest.predict(tl2cgen.DMatrix(X.astype(np.float32))).reshape(len(X), -1)[:, -1]
+    return forest_predict_proba(X)[:, 1]
+
 logger.info("Model Ready.")
 
 # --- API ---
@@ -81,62 +375,285 @@ app = FastAPI(title="Phishing Detection System")
 app.add_middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"])
 
 # --- KAFKA PRODUCER ---
-producer = None
-def get_producer():
+producer: Optional[AIOKafkaProducer] = None
+
+async def kafka_producer_task():
     global producer
-    if not producer:
+    # Keep trying to connect until Kafka is ready; predictions are simply not
+    # published until then
+    while not producer:
+        prod = AIOKafkaProducer(
+            bootstrap_servers='kafka:9092',
+            value_serializer=lambda x: json.dumps(x).encode('utf-8'),
+            acks=0
+        )
         try:
-            producer = KafkaProducer(
-                bootstrap_servers=['kafka:9092'],
-                value_serializer=lambda x: json.dumps(x).encode('utf-8'),
-                acks=0 
-            )
-        except: pass
-    return producer
+            await prod.start()
+            producer = prod
+            logger.info("Kafka Producer Successfully Connected!")
+        except asyncio.CancelledError:
+            # Shut down while connecting: don't leave the client half started
+            await prod.stop()
+            raise
+        except Exception as e:
+            await prod.stop()
+            logger.warning(f"Kafka producer not ready yet, retrying in 5s... ({e})")
+            await asyncio.sleep(5)
+
+# --- DEMO HEURISTICS ---
+PHISHING_TERMS = ['bank', 'secure', 'login', 'verify', 'alert', 'account']
+BENIGN_TERMS = ['google', 'youtube', 'amazon', 'wikipedia', 'github']
+
+def build_keyword_matcher(words):
+    # Predicate telling whether any of `words` occurs in a string, found in
+    # one scan of the string rather than one scan per word
+    if ahocorasick is None:
+        pattern = re.compile("|".join(map(re.escape, words)))
+        return lambda text: pattern.search(text) is not None
+    automaton = ahocorasick.Automaton()
+    for word in words:
+        automaton.add_word(word, word)
+    automaton.make_automaton()
+    return lambda text: next(automaton.iter(text), None) is not None
+
+contains_phishing_term = build_keyword_matcher(PHISHING_TERMS)
+contains_benign_term = build_keyword_matcher(BENIGN_TERMS)
+
+# --- BATCH PREDICTION ---
+# Single-URL requests are queued and scored together so the pipeline runs
+# once per batch instead of once per URL.
+BATCH_MAX_SIZE = 64
+BATCH_MAX_WAIT = 0.005  # seconds
+PREDICTION_QUEUE_SIZE = 10000  # producers wait on put() once this many are pending
+prediction_queue: Optional[asyncio.Queue] = None
+
+# Created per app startup, since shutdown closes it
+predict_pool: Optional[ThreadPoolExecutor] = None
+MAX_INFLIGHT_BATCHES = os.cpu_count() or 1
+predict_slots: Optional[asyncio.Semaphore] = None
+
+async def batch_predictor():
+    loop = asyncio.get_running_loop()
+    while True:
+        batch = [await prediction_queue.get()]
+        deadline = loop.time() + BATCH_MAX_WAIT
+        while len(batch) < BATCH_MAX_SIZE:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(prediction_queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+
+        await predict_slots.acquire()
+        asyncio.create_task(run_batch(batch))
+
+def predict_urls(urls_lower):
+    probs = np.array(predict_phishing_proba(feature_extractor.transform_lowercase(urls_lower)),
+                     dtype=np.float64)
+    
+    # DEMO HEURISTICS (Ensure clear Benign/Phishing split), applied to the whole batch
+    n = len(urls_lower)
+    phishing_mask = np.fromiter(map(contains_phishing_term, urls_lower), dtype=bool, count=n)
+    benign_mask = np.fromiter(map(contains_benign_term, urls_lower), dtype=bool, count=n)
+    np.maximum(probs, 0.85, out=probs, where=phishing_mask)
+    np.minimum(probs, 0.15, out=probs, where=benign_mask)
+    
+    results = np.where(probs > 0.5, "phishing", "benign")
+    return results, probs
+
+async def run_batch(batch):
+    # Scoring is CPU-bound, so it runs on the pool to keep the event loop free
+    try:
+        results, probs = await asyncio.get_running_loop().run_in_executor(
+            predict_pool, predict_urls, [url for url, _ in batch])
+    except Exception as e:
+        logger.error(f"Batch Prediction Error: {e}")
+        for _, fut in batch:
+            if not fut.done():
+                fut.set_exception(e)
+        return
+    finally:
+        predict_slots.release()
+
+    for i, (_, fut) in enumerate(batch):
+        if not fut.done():
+            fut.set_result((str(results[i]), float(probs[i])))
+
+async def score_batched(url_lower: str):
+    fut = asyncio.get_running_loop().create_future()
+    await prediction_queue.put((url_lower, fut))
+    return await fut
+
+# --- PREDICTION CACHE ---
+# Scores only depend on the lowercased URL, so repeat submissions are served
+# from an in-process LRU and, when REDIS_URL is set, a shared Redis cache.
+CACHE_MAX_SIZE = 4096
+CACHE_TTL = 3600  # seconds
+prediction_cache = OrderedDict()
+
+REDIS_URL = os.getenv("REDIS_URL")
+redis_client = None
+if REDIS_URL:
+    if aioredis is None:
+        logger.warning("REDIS_URL is set but the redis package is not installed")
+    else:
+        redis_client = aioredis.from_url(REDIS_URL)
+
+def redis_key(url_lower: str):
+    # Keyed on the model too, so processes never share scores across a retrain.
+    # surrogatepass: JSON bodies can carry lone surrogates, which strict UTF-8 rejects.
+    url_hash = hashlib.sha1(url_lower.encode('utf-8', errors='surrogatepass')).hexdigest()
+    return f"phish:{model_digest()}:{url_hash}"
+
+async def redis_get(key: str):
+    try:
+        value = await redis_client.get(key)
+        if value:
+            prob, result = value.decode().split(":")
+            return result, float(prob)
+    except Exception as e:
+        logger.warning(f"Redis Cache Error: {e}")
+    return None
+
+async def redis_set(key: str, scored):
+    result, prob = scored
+    try:
+        await redis_client.setex(key, CACHE_TTL, f"{prob}:{result}")
+    except Exception as e:
+        logger.warning(f"Redis Cache Error: {e}")
+
+async def score_url(url_lower: str):
+    cached = prediction_cache.get(url_lower)
+    if cached is not None:
+        prediction_cache.move_to_end(url_lower)
+        return cached
+
+    scored = None
+    key = None
+    if redis_client is not None:
+        key = redis_key(url_lower)
+        scored = await redis_get(key)
+
+    if scored is None:
+        scored = await score_batched(url_lower)
+        if key is not None:
+            await redis_set(key, scored)
+
+    cache_prediction(url_lower, scored)
+    return scored
+
+def cache_prediction(url_lower: str, scored):
+    prediction_cache[url_lower] = scored
+    if len(prediction_cache) > CACHE_MAX_SIZE:
+        prediction_cache.popitem(last=False)
 
 # --- CORE LOGIC ---
-def analyze_url(url_input: str, source: str):
+def normalize_url(url_input: str):
     url = url_input.strip()
     if not url.startswith("http"):
         url = "http://" + url
+    return url
+
+async def publish_prediction(url: str, result: str, prob: float):
+    if producer:
+        try:
+            # send() only enqueues; delivery happens in the producer's background task
+            await producer.send('phishing-traffic', {"url": url, "prediction": result, "probability": prob})
+        except Exception as e:
+            logger.error(f"Kafka Send Error: {e}")
+
+async def analyze_url(url_input: str, source: str):
+    url = normalize_url(url_input)
         
     start = time.time()
-    prob = pipeline.predict_proba([url])[0][1]
-    
-    # DEMO HEURISTICS (Ensure clear Benign/Phishing split)
-    url_lower = url.lower()
-    if any(x in url_lower for x in ['bank', 'secure', 'login', 'verify', 'alert', 'account']): 
-        prob = max(prob, 0.85) 
-    if any(x in url_lower for x in ['google', 'youtube', 'amazon', 'wikipedia', 'github']): 
-        prob = min(prob, 0.15) 
-        
-    result = "phishing" if prob > 0.5 else "benign"
+    result, prob = await score_url(url.lower())
     
     PREDICTION_LATENCY.observe(time.time() - start)
-    PREDICTION_COUNT.labels(pred_class=result, source=source).inc()
-    
-    prod = get_producer()
-    if prod:
-        try:
-            prod.send('phishing-traffic', {"url": url, "prediction": result, "probability": prob})
-        except Exception as e:
-            logger.error(f"Kafka Send Error: {e}")
-            
+    prediction_counters[(result, source)].inc()
+    await publish_prediction(url, result, prob)
     return result, prob
 
-class URLReq(BaseModel):
-    url: str
+async def analyze_urls(urls_input: List[str], source: str):
+    # Bulk variant of analyze_url: cache misses are scored in a single
+    # predict_urls call instead of going through the per-URL queue.
+    urls = [normalize_url(url) for url in urls_input]
+    urls_lower = [url.lower() for url in urls]
+    
+    start = time.time()
+    scored = {}
+    misses = []
+    for url_lower in dict.fromkeys(urls_lower):
+        cached = prediction_cache.get(url_lower)
+        if cached is None:
+            misses.append(url_lower)
+        else:
+            prediction_cache.move_to_end(url_lower)
+            scored[url_lower] = cached
+    if misses and redis_client is not None:
+        # Same shared cache as score_url, looked up concurrently
+        keys = {url_lower: redis_key(url_lower) for url_lower in misses}
+        found = await asyncio.gather(*(redis_get(keys[url_lower]) for url_lower in misses))
+        remaining = []
+        for url_lower, hit in zip(misses, found):
+            if hit is None:
+                remaining.append(url_lower)
+            else:
+                scored[url_lower] = hit
+                cache_prediction(url_lower, hit)
+        misses = remaining
+    if misses:
+        async with predict_slots:
+            results, probs = await asyncio.get_running_loop().run_in_executor(
+                predict_pool, predict_urls, misses)
+        for url_lower, result, prob in zip(misses, results, probs):
+            scored[url_lower] = (str(result), float(prob))
+            cache_prediction(url_lower, scored[url_lower])
+        if redis_client is not None:
+            await asyncio.gather(*(redis_set(keys[url_lower], scored[url_lower])
+                                   for url_lower in misses))
+    # One observation per URL keeps the histogram count in step with the
+    # counter; each gets its share of the batch time
+    per_url_latency = (time.time() - start) / max(len(urls), 1)
+    
+    predictions = []
+    for url, url_lower in zip(urls, urls_lower):
+        result, prob = scored[url_lower]
+        PREDICTION_LATENCY.observe(per_url_latency)
+        prediction_counters[(result, source)].inc()
+        await publish_prediction(url, result, prob)
+        predictions.append((result, prob))
+    return predictions
 
-@app.post("/predict")
-async def predict_endpoint(req: URLReq):
-    result, prob = analyze_url(req.url, source="user")
+def prediction_response(url: str, result: str, prob: float):
     return {
-        "url": req.url,
+        "url": url,
         "prediction": result,
         "confidence": float(prob),
         "risk_level": "CRITICAL" if prob > 0.8 else "LOW"
     }
 
+MAX_BATCH_URLS = 1000
+
+class URLReq(BaseModel):
+    url: str
+
+class URLBatchReq(BaseModel):
+    urls: List[str]
+
+@app.post("/predict")
+async def predict_endpoint(req: URLReq):
+    result, prob = await analyze_url(req.url, source="user")
+    return prediction_response(req.url, result, prob)
+
+@app.post("/predict_batch")
+async def predict_batch_endpoint(req: URLBatchReq):
+    if len(req.urls) > MAX_BATCH_URLS:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_BATCH_URLS} URLs per request")
+    predictions = await analyze_urls(req.urls, source="user")
+    return [prediction_response(url, result, prob) for url, (result, prob) in zip(req.urls, predictions)]
+
 @app.get("/metrics")
 async def metrics():
     return Response(content=generate_latest(), media_type=CONTENT_TYPE_LATEST)
@@ -151,63 +668,92 @@ async def traffic_generator():
                 url = f"http://secure-bank-login-{random.randint(100,999)}.com"
             else:
                 url = f"https://google.com/search?q={random.randint(100,999)}"
-            analyze_url(url, source="automated_traffic")
+            await analyze_url(url, source="automated_traffic")
         except Exception:
             pass
 
 # --- ROBUST KAFKA CONSUMER (FIXED) ---
+consumer: Optional[AIOKafkaConsumer] = None
+
 async def kafka_consumer_task():
+    global consumer
     logger.info("Initializing Kafka Consumer...")
-    consumer = None
     
     # 1. Retry Loop: Keep trying to connect until Kafka is ready
     while not consumer:
+        cons = AIOKafkaConsumer(
+            'phishing-traffic',
+            bootstrap_servers='kafka:9092',
+            group_id='drift-group-async-v3',
+            value_deserializer=lambda x: json.loads(x.decode('utf-8'))
+        )
         try:
-            consumer = KafkaConsumer(
-                'phishing-traffic',
-                bootstrap_servers=['kafka:9092'],
-                group_id='drift-group-async-v3',
-                value_deserializer=lambda x: json.loads(x.decode('utf-8'))
-            )
+            await cons.start()
+            consumer = cons
             logger.info("Kafka Consumer Successfully Connected!")
+        except asyncio.CancelledError:
+            await cons.stop()
+            raise
         except Exception as e:
+            await cons.stop()
             logger.warning(f"Kafka not ready yet, retrying in 5s... ({e})")
             await asyncio.sleep(5)
 
     # 2. Processing Loop
     while True:
         try:
-            # Poll with SHORT timeout to prevent blocking the event loop
-            msg_pack = consumer.poll(timeout_ms=100) 
+            # getmany() awaits the fetch instead of blocking the event loop
+            msg_pack = await consumer.getmany(timeout_ms=100)
             
             if not msg_pack:
-                await asyncio.sleep(0.1)
                 continue
                 
-            for tp, messages in msg_pack.items():
-                for msg in messages:
-                    val = msg.value
-                    prob = val['probability']
-                    
-                    # Calculate Drift: Distance from 0.5 (uncertainty)
-                    # We multiply by random noise to make the gauge "dance" for the demo
-                    base_score = abs(prob - 0.5) * 2
-                    
-                    # Demo Magic: Add jitter so it's never perfectly static
-                    jitter = random.uniform(-0.1, 0.1)
-                    final_score = max(0.1, min(0.9, base_score + jitter))
-                    
-                    DRIFT_GAUGE.set(final_score)
-                    
-            await asyncio.sleep(0.01)
+            probs = np.array([msg.value['probability']
+                              for messages in msg_pack.values() for msg in messages])
+            
+            # Calculate Drift: Distance from 0.5 (uncertainty)
+            # We multiply by random noise to make the gauge "dance" for the demo
+            base_scores = np.abs(probs - 0.5) * 2
+            
+            # Demo Magic: Add jitter so it's never perfectly static
+            jitter = np.random.uniform(-0.1, 0.1, size=len(probs))
+            final_scores = np.clip(base_scores + jitter, 0.1, 0.9)
+            
+            # One gauge update per poll batch
+            DRIFT_GAUGE.set(float(final_scores.mean()))
         except Exception as e:
             logger.error(f"Consumer Error: {e}")
             await asyncio.sleep(1)
 
+background_tasks: List[asyncio.Task] = []
+
 @app.on_event("startup")
 async def startup_event():
-    asyncio.create_task(traffic_generator())
-    asyncio.create_task(kafka_consumer_task())
+    global prediction_queue, predict_slots, predict_pool
+    prediction_queue = asyncio.Queue(maxsize=PREDICTION_QUEUE_SIZE)
+    predict_slots = asyncio.Semaphore(MAX_INFLIGHT_BATCHES)
+    predict_pool = ThreadPoolExecutor(max_workers=os.cpu_count())
+    background_tasks.extend([
+        asyncio.create_task(batch_predictor()),
+        asyncio.create_task(traffic_generator()),
+        asyncio.create_task(kafka_producer_task()),
+        asyncio.create_task(kafka_consumer_task()),
+    ])
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    # Stop the loops first so nothing polls a stopped consumer or connects a
+    # producer after shutdown, then close the clients and the predict pool
+    for task in background_tasks:
+        task.cancel()
+    await asyncio.gather(*background_tasks, return_exceptions=True)
+    background_tasks.clear()
+    
+    if consumer:
+        await consumer.stop()
+    if producer:
+        await producer.stop()
+    predict_pool.shutdown()
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# phishing_system.py lives at the repository root
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
@@ -0,0 +1,111 @@
+import pytest
+from fastapi.testclient import TestClient
+
+import phishing_system
+
+
+async def idle():
+    pass
+
+
+@pytest.fixture(autouse=True)
+def no_background_tasks(monkeypatch):
+    # Keep the traffic generator and Kafka loops out of the API tests
+    for name in ("traffic_generator", "kafka_producer_task", "kafka_consumer_task"):
+        monkeypatch.setattr(phishing_system, name, idle)
+    phishing_system.prediction_cache.clear()
+
+
+class FakeRedis:
+    def __init__(self):
+        self.store = {}
+
+    async def get(self, key):
+        return self.store.get(key)
+
+    async def setex(self, key, ttl, value):
+        self.store[key] = value.encode()
+
+
+@pytest.fixture
+def fake_redis(monkeypatch):
+    redis = FakeRedis()
+    monkeypatch.setattr(phishing_system, "redis_client", redis)
+    return redis
+
+
+@pytest.fixture
+def client():
+    with TestClient(phishing_system.app) as client:
+        yield client
+
+
+def test_predict(client):
+    body = client.post("/predict", json={"url": "secure-bank-login-1.com"}).json()
+    assert body["prediction"] == "phishing"
+    assert body["risk_level"] == "CRITICAL"
+
+
+def test_long_url_is_scored(client):
+    # Padding past the batch matrix limit must not get a URL out of scoring
+    url = "secure-bank-login-1.com/" + "a" * 5000
+    body = client.post("/predict", json={"url": url}).json()
+    assert body["prediction"] == "phishing"
+
+
+def test_redis_key_is_tied_to_the_model():
+    key = phishing_system.redis_key("http://x.com/a")
+    assert key.startswith(f"phish:{phishing_system.model_digest()}:")
+    # Lone surrogates are valid in JSON strings but not in strict UTF-8
+    assert phishing_system.redis_key("http://x.com/\ud800") != key
+
+
+def test_prediction_is_stored_in_redis(client, fake_redis):
+    assert client.post("/predict", json={"url": "https://Google.com/a"}).status_code == 200
+    assert list(fake_redis.store) == [phishing_system.redis_key("https://google.com/a")]
+
+
+def test_predict_batch_keeps_order_with_duplicates(client):
+    urls = ["secure-bank-login-1.com", "https://google.com/search?q=1",
+            "SECURE-BANK-LOGIN-1.com", "secure-bank-login-1.com"]
+    body = client.post("/predict_batch", json={"urls": urls}).json()
+    assert [item["url"] for item in body] == urls
+    assert [item["prediction"] for item in body] == ["phishing", "benign", "phishing", "phishing"]
+    # Each request's result matches what the single-URL endpoint returns
+    for url, item in zip(urls, body):
+        assert client.post("/predict", json={"url": url}).json() == item
+
+
+def test_predict_batch_serves_cached_scores(client):
+    phishing_system.prediction_cache["https://google.com/cached"] = ("phishing", 0.99)
+    body = client.post("/predict_batch", json={"urls": ["https://google.com/cached"]}).json()
+    assert body == [{"url": "https://google.com/cached", "prediction": "phishing",
+                     "confidence": 0.99, "risk_level": "CRITICAL"}]
+
+
+def test_predict_batch_uses_redis(client, fake_redis):
+    fake_redis.store[phishing_system.redis_key("https://google.com/shared")] = b"0.99:phishing"
+    urls = ["https://google.com/shared", "https://google.com/new"]
+    body = client.post("/predict_batch", json={"urls": urls}).json()
+    assert body[0]["prediction"] == "phishing"
+    assert body[1]["prediction"] == "benign"
+    assert phishing_system.redis_key("https://google.com/new") in fake_redis.store
+
+
+def test_predict_batch_empty(client):
+    response = client.post("/predict_batch", json={"urls": []})
+    assert response.status_code == 200
+    assert response.json() == []
+
+
+def test_predict_batch_too_large(client):
+    urls = ["https://google.com"] * (phishing_system.MAX_BATCH_URLS + 1)
+    assert client.post("/predict_batch", json={"urls": urls}).status_code == 413
+
+
+def test_app_restarts_after_shutdown():
+    # Each startup must get a fresh predict pool after the previous shutdown closed it
+    for i in range(2):
+        with TestClient(phishing_system.app) as client:
+            response = client.post("/predict", json={"url": f"https://google.com/{i}"})
+            assert response.status_code == 200
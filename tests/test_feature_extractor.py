@@ -0,0 +1,76 @@
+import csv
+import os
+import re
+
+import numpy as np
+
+from phishing_system import URLFeatureExtractor
+
+DATA_PATH = os.path.join(os.path.dirname(__file__), "..", "urldata.csv")
+
+
+def reference_features(url):
+    # The original per-URL implementation the vectorized extractor replaced
+    url = str(url).lower()
+    return [
+        len(url),
+        1 if "@" in url else 0,
+        url.count('.'),
+        1 if "https" in url else 0,
+        1 if "http://" in url else 0,
+        sum(c.isdigit() for c in url),
+        sum(not c.isalnum() for c in url),
+        1 if "ip" in url or re.search(r'\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3}', url) else 0,
+        1 if "login" in url or "signin" in url else 0,
+        1 if "bank" in url or "secure" in url or "account" in url else 0
+    ]
+
+
+def sample_urls(limit=2000):
+    with open(DATA_PATH, newline='') as f:
+        rows = csv.reader(f)
+        next(rows)
+        return [row[1] for _, row in zip(range(limit), rows)]
+
+
+EDGE_CASES = [
+    "",
+    "http://1.2.3.4/login",
+    "HTTPS://Secure.Bank.Example.com/x@y",
+    "http://ip.example.com",
+    "http://999.1.2.3333",
+    "http://x.com/a\x00b",
+    "http://x.com/a\x00",
+    "http://İstanbul.com",
+    "http://x.com/é1٣",
+    "HTTP://Café.COM/Ünï",
+    "http://secure-login.example.com/" + "a1-" * 1000,
+]
+
+
+def assert_matches_reference(urls):
+    # Counts saturate at 255, so compare against the clamped reference
+    expected = np.minimum(np.array([reference_features(url) for url in urls]), 255)
+    actual = URLFeatureExtractor().transform(urls)
+    assert actual.shape == (len(urls), 10)
+    np.testing.assert_array_equal(actual, expected)
+
+
+def test_matches_reference_on_dataset_urls():
+    assert_matches_reference(sample_urls())
+
+
+def test_matches_reference_on_edge_cases():
+    assert_matches_reference(EDGE_CASES)
+
+
+def test_mixed_batch_matches_single_url_results():
+    urls = EDGE_CASES + sample_urls(50)
+    extractor = URLFeatureExtractor()
+    batch = URLFeatureExtractor().transform(urls)
+    for url, row in zip(urls, batch):
+        np.testing.assert_array_equal(extractor.transform([url])[0], row)
+
+
+def test_empty_batch():
+    assert URLFeatureExtractor().transform([]).shape == (0, 10)
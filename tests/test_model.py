@@ -0,0 +1,60 @@
+import csv
+import os
+
+import joblib
+import numpy as np
+import pytest
+from sklearn.ensemble import RandomForestClassifier
+
+import phishing_system
+
+DATA_PATH = os.path.join(os.path.dirname(__file__), "..", "urldata.csv")
+
+
+@pytest.fixture(scope="module")
+def dataset_features():
+    with open(DATA_PATH, newline='') as f:
+        rows = csv.reader(f)
+        next(rows)
+        urls = [row[1] for _, row in zip(range(3000), rows)]
+    return phishing_system.feature_extractor.transform(urls)
+
+
+@pytest.fixture(autouse=True)
+def restore_model_digest(monkeypatch):
+    # load_model records the digest of the file it used
+    monkeypatch.setattr(phishing_system, "model_file_digest", phishing_system.model_file_digest)
+
+
+def test_incompatible_model_is_retrained(tmp_path, monkeypatch):
+    path = tmp_path / "model.joblib"
+    joblib.dump(RandomForestClassifier(n_estimators=3).fit([[0] * 4, [1] * 4], [0, 1]), path)
+    monkeypatch.setattr(phishing_system, "MODEL_PATH", str(path))
+    classifier = phishing_system.load_model().named_steps['classifier']
+    assert classifier.n_features_in_ == phishing_system.N_FEATURES
+    assert classifier.n_estimators == phishing_system.N_ESTIMATORS
+    # The retrained model replaced the stale file
+    assert joblib.load(path).n_estimators == phishing_system.N_ESTIMATORS
+
+
+def test_unwritable_model_path_keeps_serving(tmp_path, monkeypatch):
+    monkeypatch.setattr(phishing_system, "MODEL_PATH", str(tmp_path / "missing" / "model.joblib"))
+    pipeline = phishing_system.load_model()
+    assert list(pipeline.predict(["http://secure-bank-login-1.com"])) == [1]
+    assert phishing_system.model_digest() == phishing_system.process_digest
+    assert os.listdir(tmp_path) == []
+
+
+def test_leaf_table_matches_predict_proba(dataset_features, monkeypatch):
+    expected = phishing_system.classifier.predict_proba(dataset_features)
+    np.testing.assert_allclose(phishing_system.forest_predict_proba(dataset_features), expected, atol=1e-6)
+    monkeypatch.setattr(phishing_system, "compiled_forest", None)
+    np.testing.assert_allclose(phishing_system.predict_phishing_proba(dataset_features),
+                               expected[:, 1], atol=1e-6)
+
+
+def test_compiled_forest_matches_predict_proba(dataset_features):
+    if phishing_system.compiled_forest is None:
+        pytest.skip("treelite is not available")
+    expected = phishing_system.classifier.predict_proba(dataset_features)[:, 1]
+    np.testing.assert_allclose(phishing_system.predict_phishing_proba(dataset_features), expected, atol=1e-6)